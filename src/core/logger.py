@@ -43,6 +43,11 @@ class DebugLogger:
         # Prevent propagation to root logger
         self.logger.propagate = False
 
+    @property
+    def enabled(self) -> bool:
+        """Whether debug logging is on; check before formatting hot-path messages"""
+        return config.debug_enabled
+
     def _mask_token(self, token: str) -> str:
         """Mask token for logging (show first 6 and last 6 characters)"""
         if not config.debug_mask_token or len(token) <= 12:
@@ -78,7 +78,7 @@ class BrowserCaptchaService:
     """浏览器自动化获取 reCAPTCHA token（单例模式）"""
 
     _instance: Optional['BrowserCaptchaService'] = None
-    _lock = asyncio.Lock()
+    _lock: Optional[asyncio.Lock] = None  # 在运行中的事件循环内惰性创建，避免导入时绑定错误的 loop
 
     def __init__(self, db=None):
         """初始化服务（始终使用无头模式）"""
@@ -93,6 +93,8 @@ class BrowserCaptchaService:
     async def get_instance(cls, db=None) -> 'BrowserCaptchaService':
         """获取单例实例"""
         if cls._instance is None:
+            if cls._lock is None:
+                cls._lock = asyncio.Lock()
             async with cls._lock:
                 if cls._instance is None:
                     cls._instance = cls(db)
@@ -4,22 +4,55 @@
 支持常驻模式：为每个 project_id 自动创建常驻标签页，即时生成 token
 """
 import asyncio
+import enum
 import time
 import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
 from typing import Optional
 
 import nodriver as uc
+from nodriver import cdp
 
 from ..core.logger import debug_logger
 
 
+class ServiceState(enum.IntEnum):
+    """BrowserCaptchaService 生命周期状态"""
+    UNINIT = 0          # 浏览器未启动
+    BROWSER_READY = 1   # 浏览器已启动
+    TAB_LOADING = 2     # 常驻模式启动中（页面 / reCAPTCHA 加载）
+    CAPTCHA_READY = 3   # 常驻模式已就绪
+    CLOSING = 4         # 正在关闭
+
+
+# 合法的状态迁移
+_STATE_TRANSITIONS: dict[ServiceState, set[ServiceState]] = {
+    ServiceState.UNINIT: {ServiceState.BROWSER_READY, ServiceState.CLOSING},
+    ServiceState.BROWSER_READY: {ServiceState.TAB_LOADING, ServiceState.UNINIT, ServiceState.CLOSING},
+    ServiceState.TAB_LOADING: {ServiceState.CAPTCHA_READY, ServiceState.BROWSER_READY, ServiceState.UNINIT, ServiceState.CLOSING},
+    ServiceState.CAPTCHA_READY: {ServiceState.BROWSER_READY, ServiceState.UNINIT, ServiceState.CLOSING},
+    ServiceState.CLOSING: {ServiceState.UNINIT},
+}
+
+
 class ResidentTabInfo:
     """常驻标签页信息结构"""
-    def __init__(self, tab, project_id: str):
+    def __init__(self, tab, project_id: str, prefetch_size: int = 3):
         self.tab = tab
         self.project_id = project_id
         self.recaptcha_ready = False
         self.created_at = time.time()
+        # 预取 token 队列：元素为 (token, 生成时的 time.monotonic())
+        self.token_queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch_size)
+        self.refill_event = asyncio.Event()
+        self.refill_task: Optional[asyncio.Task] = None
+        # 串行化该标签页上的 token 生成与页面刷新
+        self.lock = asyncio.Lock()
+        # 自上次刷新以来成功生成的 token 数，达到阈值后刷新页面回收 JS 堆
+        self.token_count = 0
+        self.reload_task: Optional[asyncio.Task] = None
 
 
 class BrowserCaptchaService:
@@ -31,80 +64,148 @@ class BrowserCaptchaService:
     """
 
     _instance: Optional['BrowserCaptchaService'] = None
-    _lock = asyncio.Lock()
+    _lock: Optional[asyncio.Lock] = None  # 在运行中的事件循环内惰性创建，避免导入时绑定错误的 loop
+
+    # 常驻标签页中预装的 token 生成函数名称
+    TOKEN_FUNCTION = "__getFlowToken"
+    # 常驻标签页池上限，超出时关闭最久未使用的标签页
+    MAX_RESIDENT_TABS = 4
+    # 常驻标签页健康检查间隔与单次探测超时（秒）
+    HEALTH_CHECK_INTERVAL = 30
+    HEALTH_CHECK_TIMEOUT = 2.0
+    # 常驻标签页每成功生成多少个 token 后刷新一次页面
+    RESIDENT_RELOAD_INTERVAL = 200
+    # 每个常驻标签页预取的 token 数量
+    PREFETCH_QUEUE_SIZE = 3
+    # 预取 token 的最长使用期限（秒），reCAPTCHA token 约 2 分钟过期
+    PREFETCH_TOKEN_TTL = 90
+    # 传统模式每次打开页面时额外生成并缓存的 token 数量
+    LEGACY_EXTRA_TOKENS = 2
+    # 缓存 token 剩余有效期低于该值（秒）时不再使用
+    TOKEN_CACHE_MIN_REMAINING = 10
 
     def __init__(self, db=None):
         """初始化服务"""
         self.headless = False  # nodriver 有头模式
         self.browser = None
-        self._initialized = False
+        self.state = ServiceState.UNINIT
+        self._state_lock = asyncio.Lock()  # 串行化 initialize / start_resident_mode / stop_resident_mode / close
         self.website_key = "6LdsFiUsAAAAAIjVDZcuLhaHiDn5nnHVXVRQGeMV"
         self.db = db
+        # 浏览器目录只在此解析一次，避免重新初始化时工作目录变化导致 profile 分散
+        base_dir = Path(os.getcwd()).resolve()
         # 持久化 profile 目录
-        self.user_data_dir = os.path.join(os.getcwd(), "browser_data")
+        self.user_data_dir: str = str(base_dir / "browser_data")
+        # 预置 profile 模板（已登录 Google 并访问过 labs.google），首次启动时复制为 user_data_dir
+        self.profile_template_dir: str = str(base_dir / "browser_data.template")
+        # 持久化 HTTP 磁盘缓存目录，跨重启复用已缓存的页面与脚本
+        self.disk_cache_dir: str = str(base_dir / "browser_cache")
+        self._prepare_user_data_dir()
         
         # 常驻模式相关属性 (支持多 project_id)
-        self._resident_tabs: dict[str, 'ResidentTabInfo'] = {}  # project_id -> 常驻标签页信息
+        self._resident_tabs: OrderedDict[str, 'ResidentTabInfo'] = OrderedDict()  # project_id -> 常驻标签页信息（按最近使用排序）
         self._resident_lock = asyncio.Lock()  # 保护常驻标签页操作
+        self._inflight: dict[str, asyncio.Future] = {}  # project_id -> 正在创建常驻标签页的 Future
+        self._health_task: Optional[asyncio.Task] = None  # 常驻标签页健康检查任务
+        
+        # 传统模式 token 缓存 (reCAPTCHA token 只能校验一次，每个缓存 token 只发放一次)
+        self._token_cache: dict[str, list[tuple[str, float]]] = {}  # project_id -> [(token, 过期时间 monotonic)]
+        self._legacy_locks: dict[str, asyncio.Lock] = {}  # project_id -> 传统模式锁，防止缓存耗尽时并发开页
         
         # 兼容旧 API（保留 single resident 属性作为别名）
         self.resident_project_id: Optional[str] = None  # 向后兼容
         self.resident_tab = None                         # 向后兼容
-        self._running = False                            # 向后兼容
-        self._recaptcha_ready = False                    # 向后兼容
 
     @classmethod
     async def get_instance(cls, db=None) -> 'BrowserCaptchaService':
         """获取单例实例"""
         if cls._instance is None:
+            if cls._lock is None:
+                cls._lock = asyncio.Lock()
             async with cls._lock:
                 if cls._instance is None:
                     cls._instance = cls(db)
         return cls._instance
 
+    def _set_state(self, new_state: ServiceState):
+        """切换服务状态（调用方需持有 _state_lock）"""
+        if new_state != self.state and new_state not in _STATE_TRANSITIONS[self.state]:
+            raise RuntimeError(f"非法的状态迁移: {self.state.name} -> {new_state.name}")
+        self.state = new_state
+
+    def _is_browser_alive(self) -> bool:
+        """浏览器已启动且仍在运行（无锁读取，供热路径使用）"""
+        if self.state not in (ServiceState.BROWSER_READY, ServiceState.TAB_LOADING, ServiceState.CAPTCHA_READY):
+            return False
+        try:
+            return self.browser is not None and not self.browser.stopped
+        except Exception:
+            return False
+
     async def initialize(self):
         """初始化 nodriver 浏览器"""
-        if self._initialized and self.browser:
-            # 检查浏览器是否仍然存活
-            try:
-                # 尝试获取浏览器信息验证存活
-                if self.browser.stopped:
-                    debug_logger.log_warning("[BrowserCaptcha] 浏览器已停止，重新初始化...")
-                    self._initialized = False
-                else:
-                    return
-            except Exception:
-                debug_logger.log_warning("[BrowserCaptcha] 浏览器无响应，重新初始化...")
-                self._initialized = False
+        if self._is_browser_alive():
+            return
+        async with self._state_lock:
+            await self._initialize_locked()
+
+    async def _initialize_locked(self):
+        """初始化 nodriver 浏览器（调用方需持有 _state_lock）"""
+        if self.state == ServiceState.CLOSING:
+            raise RuntimeError("浏览器正在关闭，无法初始化")
+        if self._is_browser_alive():
+            return
+        if self.state != ServiceState.UNINIT:
+            debug_logger.log_warning("[BrowserCaptcha] 浏览器已停止或无响应，重新初始化...")
+            self._set_state(ServiceState.UNINIT)
 
         try:
             debug_logger.log_info(f"[BrowserCaptcha] 正在启动 nodriver 浏览器 (用户数据目录: {self.user_data_dir})...")
 
-            # 确保 user_data_dir 存在
-            os.makedirs(self.user_data_dir, exist_ok=True)
+            browser_args = [
+                '--no-sandbox',
+                '--disable-setuid-sandbox',
+                '--window-size=1280,720',
+                '--profile-directory=Default',  # 跳过 Profile 选择器页面
+                f'--disk-cache-dir={self.disk_cache_dir}',
+                '--disable-background-networking',
+                '--disable-sync',
+                '--disable-features=Translate,MediaRouter,OptimizationHints,InterestFeedContentSuggestions',
+            ]
+            if self._is_dev_shm_small():
+                browser_args.append('--disable-dev-shm-usage')
 
             # 启动 nodriver 浏览器
             self.browser = await uc.start(
                 headless=self.headless,
                 user_data_dir=self.user_data_dir,
                 sandbox=False,  # nodriver 需要此参数来禁用 sandbox
-                browser_args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-setuid-sandbox',
-                    '--disable-gpu',
-                    '--window-size=1280,720',
-                    '--profile-directory=Default',  # 跳过 Profile 选择器页面
-                ]
+                browser_args=browser_args
             )
 
-            self._initialized = True
+            self._set_state(ServiceState.BROWSER_READY)
             debug_logger.log_info(f"[BrowserCaptcha] ✅ nodriver 浏览器已启动 (Profile: {self.user_data_dir})")
 
         except Exception as e:
             debug_logger.log_error(f"[BrowserCaptcha] ❌ 浏览器启动失败: {str(e)}")
             raise
 
+    def _prepare_user_data_dir(self):
+        """创建 profile 目录（首次运行时从模板预置），仅在构造时执行一次"""
+        user_data_dir = Path(self.user_data_dir)
+        if not user_data_dir.exists() and Path(self.profile_template_dir).is_dir():
+            debug_logger.log_info(f"[BrowserCaptcha] 从模板初始化 profile: {self.profile_template_dir}")
+            shutil.copytree(self.profile_template_dir, user_data_dir)
+        user_data_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _is_dev_shm_small(min_bytes: int = 512 * 1024 * 1024) -> bool:
+        """/dev/shm 是否过小（如 Docker 默认 64MB），过小时需改用 /tmp 作为共享内存"""
+        try:
+            return shutil.disk_usage("/dev/shm").total < min_bytes
+        except OSError:
+            return True
+
     # ========== 常驻模式 API ==========
 
     async def start_resident_mode(self, project_id: str):
@@ -113,12 +214,37 @@ class BrowserCaptchaService:
         Args:
             project_id: 用于常驻的项目 ID
         """
-        if self._running:
-            debug_logger.log_warning("[BrowserCaptcha] 常驻模式已在运行")
-            return
+        async with self._state_lock:
+            if self.state == ServiceState.CAPTCHA_READY:
+                debug_logger.log_warning("[BrowserCaptcha] 常驻模式已在运行")
+                return
+            
+            await self._initialize_locked()
+            self._set_state(ServiceState.TAB_LOADING)
+            started = False
+            try:
+                started = await self._start_resident_tab(project_id)
+            finally:
+                if self.state == ServiceState.TAB_LOADING:
+                    self._set_state(ServiceState.CAPTCHA_READY if started else ServiceState.BROWSER_READY)
+                if not started:
+                    # 启动失败，清理半途创建的标签页
+                    await self._discard_legacy_resident_tab()
+            
+            if not started:
+                return
         
-        await self.initialize()
+        debug_logger.log_info(f"[BrowserCaptcha] ✅ 常驻模式已启动 (project: {project_id})")
+
+    async def _start_resident_tab(self, project_id: str) -> bool:
+        """创建常驻模式启动时的标签页并等待 reCAPTCHA 就绪
         
+        Args:
+            project_id: 用于常驻的项目 ID
+            
+        Returns:
+            True if resident tab is ready
+        """
         self.resident_project_id = project_id
         website_url = f"https://labs.google/fx/tools/flow/project/{project_id}"
         
@@ -129,42 +255,83 @@ class BrowserCaptchaService:
         
         debug_logger.log_info("[BrowserCaptcha] 标签页已创建，等待页面加载...")
         
-        # 等待页面加载完成（带重试机制）
+        # 等待页面加载完成（订阅 Page.loadEventFired，带重连机制）
         page_loaded = False
-        for retry in range(60):
+        reconnecting = False
+        delay = 0.05
+        for retry in range(8):
             try:
-                await asyncio.sleep(1)
-                ready_state = await self.resident_tab.evaluate("document.readyState")
-                debug_logger.log_info(f"[BrowserCaptcha] 页面状态: {ready_state} (重试 {retry + 1}/60)")
-                if ready_state == "complete":
-                    page_loaded = True
-                    break
+                page_loaded = await self._wait_for_page_load(self.resident_tab, reload=reconnecting)
+                break
             except ConnectionRefusedError as e:
-                debug_logger.log_warning(f"[BrowserCaptcha] 标签页连接丢失: {e}，尝试重新获取...")
-                # 标签页可能已关闭，尝试重新创建
+                if not reconnecting:
+                    # 连接抖动时先原地刷新，避免每次重连都遗留一个标签页
+                    debug_logger.log_warning(f"[BrowserCaptcha] 标签页连接丢失: {e}，尝试原地刷新...")
+                    reconnecting = True
+                    continue
+                # 原地刷新仍失败，标签页本身已失效，关闭后重新创建
+                debug_logger.log_warning(f"[BrowserCaptcha] 标签页已失效: {e}，重新创建...")
+                old_tab = self.resident_tab
                 try:
                     self.resident_tab = await self.browser.get(website_url, new_tab=True)
+                    reconnecting = False
+                    await self._close_tab_quietly(old_tab)
                     debug_logger.log_info("[BrowserCaptcha] 已重新创建标签页")
                 except Exception as e2:
                     debug_logger.log_error(f"[BrowserCaptcha] 重新创建标签页失败: {e2}")
-                await asyncio.sleep(2)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 1.7, 1.0)
             except Exception as e:
-                debug_logger.log_warning(f"[BrowserCaptcha] 等待页面异常: {e}，重试 {retry + 1}/15...")
-                await asyncio.sleep(2)
+                debug_logger.log_warning(f"[BrowserCaptcha] 等待页面异常: {e}，重试 {retry + 1}/8...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 1.7, 1.0)
         
         if not page_loaded:
             debug_logger.log_error("[BrowserCaptcha] 页面加载超时，常驻模式启动失败")
-            return
+            return False
         
         # 等待 reCAPTCHA 加载
-        self._recaptcha_ready = await self._wait_for_recaptcha(self.resident_tab)
-        
-        if not self._recaptcha_ready:
+        if not await self._wait_for_recaptcha(self.resident_tab):
             debug_logger.log_error("[BrowserCaptcha] reCAPTCHA 加载失败，常驻模式启动失败")
-            return
+            return False
         
-        self._running = True
-        debug_logger.log_info(f"[BrowserCaptcha] ✅ 常驻模式已启动 (project: {project_id})")
+        # 预装 token 生成函数，后续请求只需一次函数调用
+        if not await self._install_token_function(self.resident_tab):
+            debug_logger.log_warning("[BrowserCaptcha] token 生成函数预装失败，将在首次生成时安装")
+        
+        # 注册为该 project_id 的常驻标签页，get_token 可直接复用并开始预取 token
+        async with self._resident_lock:
+            pooled_info = self._resident_tabs.get(project_id)
+            if pooled_info is None:
+                resident_info = ResidentTabInfo(self.resident_tab, project_id, self.PREFETCH_QUEUE_SIZE)
+                resident_info.recaptcha_ready = True
+                await self._register_resident_tab(resident_info)
+            else:
+                # 该 project_id 已有常驻标签页，关闭新建的标签页并复用已有的
+                await self._close_tab_quietly(self.resident_tab)
+                self.resident_tab = pooled_info.tab
+        
+        return True
+
+    @staticmethod
+    async def _close_tab_quietly(tab):
+        """关闭标签页，忽略已失效标签页的异常"""
+        try:
+            await tab.close()
+        except Exception:
+            pass
+
+    async def _discard_legacy_resident_tab(self, close_tab: bool = True):
+        """清空向后兼容的 resident_tab 属性
+        
+        Args:
+            close_tab: 是否关闭该标签页；已登记到常驻池的标签页只能经 _close_resident_tab 关闭
+        """
+        tab = self.resident_tab
+        self.resident_tab = None
+        self.resident_project_id = None
+        if close_tab and tab and not any(info.tab is tab for info in self._resident_tabs.values()):
+            await self._close_tab_quietly(tab)
 
     async def stop_resident_mode(self, project_id: Optional[str] = None):
         """停止常驻模式
@@ -172,37 +339,37 @@ class BrowserCaptchaService:
         Args:
             project_id: 指定要关闭的 project_id，如果为 None 则关闭所有常驻标签页
         """
+        async with self._state_lock:
+            await self._stop_resident_mode_locked(project_id)
+
+    async def _stop_resident_mode_locked(self, project_id: Optional[str] = None):
+        """停止常驻模式（调用方需持有 _state_lock）"""
         async with self._resident_lock:
             if project_id:
                 # 关闭指定的常驻标签页
                 await self._close_resident_tab(project_id)
+                self._token_cache.pop(project_id, None)
                 debug_logger.log_info(f"[BrowserCaptcha] 已关闭 project_id={project_id} 的常驻模式")
             else:
                 # 关闭所有常驻标签页
                 project_ids = list(self._resident_tabs.keys())
                 for pid in project_ids:
-                    resident_info = self._resident_tabs.pop(pid, None)
-                    if resident_info and resident_info.tab:
-                        try:
-                            await resident_info.tab.close()
-                        except Exception:
-                            pass
+                    await self._close_resident_tab(pid)
+                self._token_cache.clear()
+                if self._health_task:
+                    self._health_task.cancel()
+                    self._health_task = None
                 debug_logger.log_info(f"[BrowserCaptcha] 已关闭所有常驻标签页 (共 {len(project_ids)} 个)")
         
-        # 向后兼容：清理旧属性
-        if not self._running:
+        # 向后兼容：仅当停止的是启动时的常驻 project 时清理旧属性
+        # （该标签页已在常驻池中经 _close_resident_tab 关闭，这里只丢弃引用）
+        if self.state != ServiceState.CAPTCHA_READY:
+            return
+        if project_id and project_id != self.resident_project_id:
             return
         
-        self._running = False
-        if self.resident_tab:
-            try:
-                await self.resident_tab.close()
-            except Exception:
-                pass
-            self.resident_tab = None
-        
-        self.resident_project_id = None
-        self._recaptcha_ready = False
+        self._set_state(ServiceState.BROWSER_READY)
+        await self._discard_legacy_resident_tab(close_tab=False)
 
     async def _wait_for_recaptcha(self, tab) -> bool:
         """等待 reCAPTCHA 加载
@@ -210,47 +377,101 @@ class BrowserCaptchaService:
         Returns:
             True if reCAPTCHA loaded successfully
         """
-        debug_logger.log_info("[BrowserCaptcha] 检测 reCAPTCHA...")
-        
-        # 检查 grecaptcha.enterprise.execute
-        is_enterprise = await tab.evaluate(
-            "typeof grecaptcha !== 'undefined' && typeof grecaptcha.enterprise !== 'undefined' && typeof grecaptcha.enterprise.execute === 'function'"
-        )
+        if debug_logger.enabled:
+            debug_logger.log_info("[BrowserCaptcha] 检测 reCAPTCHA...")
         
-        if is_enterprise:
-            debug_logger.log_info("[BrowserCaptcha] reCAPTCHA Enterprise 已加载")
-            return True
+        # 检测、按需注入脚本、等待 grecaptcha.enterprise.execute 就绪合并为一个 Promise，
+        # 页面端以 50ms 间隔检查，Python 侧只需一次 CDP 往返
+        wait_script = f"""
+            new Promise((resolve) => {{
+                const isReady = () => typeof grecaptcha !== 'undefined' && typeof grecaptcha.enterprise !== 'undefined' && typeof grecaptcha.enterprise.execute === 'function';
+                if (isReady()) {{
+                    resolve(true);
+                    return;
+                }}
+                if (!document.querySelector('script[src*="recaptcha"]')) {{
+                    const script = document.createElement('script');
+                    script.src = 'https://www.google.com/recaptcha/api.js?render={self.website_key}';
+                    script.async = true;
+                    document.head.appendChild(script);
+                }}
+                const iv = setInterval(() => {{
+                    if (isReady()) {{
+                        clearInterval(iv);
+                        clearTimeout(timer);
+                        resolve(true);
+                    }}
+                }}, 50);
+                const timer = setTimeout(() => {{
+                    clearInterval(iv);
+                    resolve(false);
+                }}, 15000);
+            }})
+        """
         
-        # 尝试注入脚本
-        debug_logger.log_info("[BrowserCaptcha] 未检测到 reCAPTCHA，注入脚本...")
-        
-        await tab.evaluate(f"""
-            (() => {{
-                if (document.querySelector('script[src*="recaptcha"]')) return;
-                const script = document.createElement('script');
-                script.src = 'https://www.google.com/recaptcha/api.js?render={self.website_key}';
-                script.async = true;
-                document.head.appendChild(script);
-            }})()
-        """)
-        
-        # 等待脚本加载
-        await tab.sleep(3)
-        
-        # 轮询等待 reCAPTCHA 加载
-        for i in range(20):
-            is_enterprise = await tab.evaluate(
-                "typeof grecaptcha !== 'undefined' && typeof grecaptcha.enterprise !== 'undefined' && typeof grecaptcha.enterprise.execute === 'function'"
+        start_time = time.time()
+        try:
+            is_enterprise = await asyncio.wait_for(
+                tab.evaluate(wait_script, await_promise=True),
+                timeout=20
             )
-            
-            if is_enterprise:
-                debug_logger.log_info(f"[BrowserCaptcha] reCAPTCHA Enterprise 已加载（等待了 {i * 0.5} 秒）")
-                return True
-            await tab.sleep(0.5)
+        except asyncio.TimeoutError:
+            is_enterprise = False
+        
+        if isinstance(is_enterprise, cdp.runtime.ExceptionDetails):
+            debug_logger.log_warning(f"[BrowserCaptcha] reCAPTCHA 检测脚本异常: {self._format_js_exception(is_enterprise)}")
+        elif is_enterprise is True:
+            if debug_logger.enabled:
+                debug_logger.log_info(f"[BrowserCaptcha] reCAPTCHA Enterprise 已加载（等待了 {time.time() - start_time:.1f} 秒）")
+            return True
         
         debug_logger.log_warning("[BrowserCaptcha] reCAPTCHA 加载超时")
         return False
 
+    async def _wait_for_page_load(self, tab, timeout: float = 60, reload: bool = False) -> bool:
+        """等待页面加载完成（订阅 Page.loadEventFired 事件，仅在等待期间启用 Page 域）
+        
+        Args:
+            tab: nodriver 标签页对象
+            timeout: 最长等待秒数
+            reload: 订阅事件后刷新页面，并等待刷新后的加载完成
+            
+        Returns:
+            True if page loaded before timeout
+        """
+        loaded_event = asyncio.Event()
+        
+        def on_load_event_fired(event: cdp.page.LoadEventFired):
+            loaded_event.set()
+        
+        tab.add_handler(cdp.page.LoadEventFired, on_load_event_fired)
+        try:
+            await tab.send(cdp.page.enable())
+            if reload:
+                # 保留磁盘缓存，避免重新从网络拉取页面与 reCAPTCHA 脚本
+                await tab.reload(ignore_cache=False)
+                already_loaded = False
+            else:
+                # 订阅后检查一次，避免事件在订阅前已触发
+                already_loaded = await tab.evaluate(
+                    "location.href !== 'about:blank' && document.readyState === 'complete'"
+                )
+                if isinstance(already_loaded, cdp.runtime.ExceptionDetails):
+                    debug_logger.log_warning(f"[BrowserCaptcha] 检查页面状态失败: {self._format_js_exception(already_loaded)}")
+                    already_loaded = False
+            if already_loaded is not True:
+                await asyncio.wait_for(loaded_event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            tab.remove_handler(cdp.page.LoadEventFired, on_load_event_fired)
+            # remove_handler 不会通知浏览器，需显式关闭 Page 域，避免常驻标签页持续推送事件
+            try:
+                await tab.send(cdp.page.disable())
+            except Exception:
+                pass
+
     async def _execute_recaptcha_on_tab(self, tab) -> Optional[str]:
         """在指定标签页执行 reCAPTCHA 获取 token
         
@@ -260,54 +481,152 @@ class BrowserCaptchaService:
         Returns:
             reCAPTCHA token 或 None
         """
-        # 生成唯一变量名避免冲突
-        ts = int(time.time() * 1000)
-        token_var = f"_recaptcha_token_{ts}"
-        error_var = f"_recaptcha_error_{ts}"
+        # 直接返回 Promise，由 CDP awaitPromise 等待浏览器端 resolve，无需轮询
+        execute_script = f"""
+            new Promise((resolve, reject) => {{
+                grecaptcha.enterprise.ready(() => {{
+                    grecaptcha.enterprise.execute('{self.website_key}', {{action: 'FLOW_GENERATION'}})
+                        .then(resolve)
+                        .catch((err) => reject((err && err.message) || 'execute failed'));
+                }});
+            }})
+        """
+        
+        return await self._await_token_promise(tab, execute_script)
+
+    def _token_function_script(self) -> str:
+        """常驻标签页 token 生成函数的 JS 定义（site key 与 action 在标签页生命周期内固定）"""
+        return f"() => grecaptcha.enterprise.execute('{self.website_key}', {{action: 'FLOW_GENERATION'}})"
+
+    async def _install_token_function(self, tab) -> bool:
+        """在常驻标签页中预装 window.__getFlowToken
+        
+        Args:
+            tab: nodriver 标签页对象
+            
+        Returns:
+            True if installed successfully
+        """
+        install_script = f"""
+            new Promise((resolve) => {{
+                grecaptcha.enterprise.ready(() => {{
+                    window.{self.TOKEN_FUNCTION} = {self._token_function_script()};
+                    resolve(typeof window.{self.TOKEN_FUNCTION} === 'function');
+                }});
+            }})
+        """
+        try:
+            result = await asyncio.wait_for(
+                tab.evaluate(install_script, await_promise=True),
+                timeout=15
+            )
+        except Exception as e:
+            debug_logger.log_warning(f"[BrowserCaptcha] 安装 token 生成函数失败: {e}")
+            return False
         
+        if isinstance(result, cdp.runtime.ExceptionDetails):
+            debug_logger.log_warning(f"[BrowserCaptcha] 安装 token 生成函数失败: {self._format_js_exception(result)}")
+            return False
+        return result is True
+
+    async def _execute_recaptcha_fast(self, tab) -> Optional[str]:
+        """在常驻标签页调用预装的 token 生成函数获取 token
+        
+        页面被刷新后函数会丢失，此时经 grecaptcha.enterprise.ready 等待就绪后就地重新安装。
+        
+        Args:
+            tab: nodriver 标签页对象
+            
+        Returns:
+            reCAPTCHA token 或 None
+        """
+        fn = f"window.{self.TOKEN_FUNCTION}"
         execute_script = f"""
-            (() => {{
-                window.{token_var} = null;
-                window.{error_var} = null;
-                
-                try {{
-                    grecaptcha.enterprise.ready(function() {{
-                        grecaptcha.enterprise.execute('{self.website_key}', {{action: 'FLOW_GENERATION'}})
-                            .then(function(token) {{
-                                window.{token_var} = token;
-                            }})
-                            .catch(function(err) {{
-                                window.{error_var} = err.message || 'execute failed';
-                            }});
-                    }});
-                }} catch (e) {{
-                    window.{error_var} = e.message || 'exception';
-                }}
-            }})()
+            (typeof {fn} === 'function'
+                ? {fn}()
+                : typeof grecaptcha === 'undefined' || typeof grecaptcha.enterprise === 'undefined'
+                    ? Promise.reject('grecaptcha not loaded')
+                    : new Promise((resolve) => grecaptcha.enterprise.ready(resolve))
+                        .then(() => ({fn} = {self._token_function_script()})()))
         """
+        return await self._await_token_promise(tab, execute_script)
+
+    async def _execute_on_resident_tab(self, resident_info: ResidentTabInfo) -> Optional[str]:
+        """持有标签页锁在常驻标签页上生成 token，避免与页面刷新交错
         
-        # 注入执行脚本
-        await tab.evaluate(execute_script)
+        Args:
+            resident_info: 常驻标签页信息
+            
+        Returns:
+            reCAPTCHA token 或 None
+        """
+        async with resident_info.lock:
+            token = await self._execute_recaptcha_fast(resident_info.tab)
         
-        # 轮询等待结果（最多 15 秒）
-        token = None
-        for i in range(30):
-            await tab.sleep(0.5)
-            token = await tab.evaluate(f"window.{token_var}")
-            if token:
-                break
-            error = await tab.evaluate(f"window.{error_var}")
-            if error:
-                debug_logger.log_error(f"[BrowserCaptcha] reCAPTCHA 错误: {error}")
-                break
+        if token:
+            resident_info.token_count += 1
+            if resident_info.token_count >= self.RESIDENT_RELOAD_INTERVAL and resident_info.reload_task is None:
+                resident_info.reload_task = asyncio.create_task(self._reload_resident_tab(resident_info))
+        return token
+
+    async def _reload_resident_tab(self, resident_info: ResidentTabInfo):
+        """刷新常驻标签页以重置长期运行积累的页面状态，并重新预装 token 生成函数
         
-        # 清理临时变量
+        Args:
+            resident_info: 常驻标签页信息
+        """
         try:
-            await tab.evaluate(f"delete window.{token_var}; delete window.{error_var};")
-        except:
-            pass
+            async with resident_info.lock:
+                debug_logger.log_info(f"[BrowserCaptcha] 常驻标签页已生成 {resident_info.token_count} 个 token，刷新页面 (project: {resident_info.project_id})")
+                if not await self._wait_for_page_load(resident_info.tab, reload=True):
+                    debug_logger.log_warning(f"[BrowserCaptcha] 常驻标签页刷新超时 (project: {resident_info.project_id})")
+                    return
+                if await self._wait_for_recaptcha(resident_info.tab):
+                    await self._install_token_function(resident_info.tab)
+                resident_info.token_count = 0
+        except Exception as e:
+            debug_logger.log_warning(f"[BrowserCaptcha] 常驻标签页刷新异常 (project: {resident_info.project_id}): {e}")
+        finally:
+            resident_info.reload_task = None
+
+    async def _await_token_promise(self, tab, script: str) -> Optional[str]:
+        """执行返回 token Promise 的脚本，并等待其 resolve（最多 15 秒）
         
-        return token
+        Args:
+            tab: nodriver 标签页对象
+            script: 求值结果为 Promise<string> 的 JS 表达式
+            
+        Returns:
+            reCAPTCHA token 或 None
+        """
+        token = None
+        try:
+            token = await asyncio.wait_for(
+                tab.evaluate(script, await_promise=True),
+                timeout=15
+            )
+        except asyncio.TimeoutError:
+            debug_logger.log_error("[BrowserCaptcha] reCAPTCHA 执行超时")
+        except Exception as e:
+            debug_logger.log_error(f"[BrowserCaptcha] reCAPTCHA 错误: {e}")
+        
+        # nodriver 不会抛出 JS 异常 / Promise reject，而是返回 ExceptionDetails
+        if isinstance(token, cdp.runtime.ExceptionDetails):
+            debug_logger.log_error(f"[BrowserCaptcha] reCAPTCHA 错误: {self._format_js_exception(token)}")
+            return None
+        
+        return token if isinstance(token, str) else None
+
+    @staticmethod
+    def _format_js_exception(details) -> str:
+        """提取 cdp.runtime.ExceptionDetails 中的错误信息"""
+        exception = details.exception
+        if exception is not None:
+            if exception.description:
+                return exception.description
+            if exception.value is not None:
+                return str(exception.value)
+        return details.text
 
     # ========== 主要 API ==========
 
@@ -322,57 +641,114 @@ class BrowserCaptchaService:
         Returns:
             reCAPTCHA token字符串，如果获取失败返回None
         """
+        # 优先使用传统模式缓存的未发放 token
+        token = self._pop_cached_token(project_id)
+        if token:
+            return token
+        
         # 确保浏览器已初始化
         await self.initialize()
         
-        # 尝试从常驻标签页获取 token
-        async with self._resident_lock:
-            resident_info = self._resident_tabs.get(project_id)
-            
-            # 如果该 project_id 没有常驻标签页，则自动创建
-            if resident_info is None:
-                debug_logger.log_info(f"[BrowserCaptcha] project_id={project_id} 没有常驻标签页，正在创建...")
-                resident_info = await self._create_resident_tab(project_id)
-                if resident_info is None:
-                    debug_logger.log_warning(f"[BrowserCaptcha] 无法为 project_id={project_id} 创建常驻标签页，fallback 到传统模式")
-                    return await self._get_token_legacy(project_id)
-                self._resident_tabs[project_id] = resident_info
-                debug_logger.log_info(f"[BrowserCaptcha] ✅ 已为 project_id={project_id} 创建常驻标签页 (当前共 {len(self._resident_tabs)} 个)")
+        # 尝试从常驻标签页获取 token（没有则自动创建）
+        resident_info = await self._get_or_create_resident_tab(project_id)
+        if resident_info is None:
+            debug_logger.log_warning(f"[BrowserCaptcha] 无法为 project_id={project_id} 创建常驻标签页，fallback 到传统模式")
+            return await self._get_token_legacy(project_id)
         
         # 使用常驻标签页生成 token
         if resident_info and resident_info.recaptcha_ready and resident_info.tab:
+            # 优先使用预取的 token
+            token = self._pop_prefetched_token(resident_info)
+            if token:
+                if debug_logger.enabled:
+                    debug_logger.log_info(f"[BrowserCaptcha] ✅ 使用预取 token (project: {project_id})")
+                return token
+            
             start_time = time.time()
-            debug_logger.log_info(f"[BrowserCaptcha] 从常驻标签页即时生成 token (project: {project_id})...")
+            if debug_logger.enabled:
+                debug_logger.log_info(f"[BrowserCaptcha] 从常驻标签页即时生成 token (project: {project_id})...")
             try:
-                token = await self._execute_recaptcha_on_tab(resident_info.tab)
-                duration_ms = (time.time() - start_time) * 1000
+                token = await self._execute_on_resident_tab(resident_info)
                 if token:
-                    debug_logger.log_info(f"[BrowserCaptcha] ✅ Token生成成功（耗时 {duration_ms:.0f}ms）")
+                    if debug_logger.enabled:
+                        duration_ms = (time.time() - start_time) * 1000
+                        debug_logger.log_info(f"[BrowserCaptcha] ✅ Token生成成功（耗时 {duration_ms:.0f}ms）")
                     return token
                 else:
                     debug_logger.log_warning(f"[BrowserCaptcha] 常驻标签页生成失败 (project: {project_id})，尝试重建...")
             except Exception as e:
                 debug_logger.log_warning(f"[BrowserCaptcha] 常驻标签页异常: {e}，尝试重建...")
             
-            # 常驻标签页失效，尝试重建
-            async with self._resident_lock:
-                await self._close_resident_tab(project_id)
-                resident_info = await self._create_resident_tab(project_id)
-                if resident_info:
-                    self._resident_tabs[project_id] = resident_info
-                    # 重建后立即尝试生成
-                    try:
-                        token = await self._execute_recaptcha_on_tab(resident_info.tab)
-                        if token:
-                            debug_logger.log_info(f"[BrowserCaptcha] ✅ 重建后 Token生成成功")
-                            return token
-                    except Exception:
-                        pass
+            # 常驻标签页失效，尝试重建（并发的失败调用方共享同一次重建）
+            resident_info = await self._rebuild_resident_tab(project_id, resident_info)
+            if resident_info:
+                # 重建后立即尝试生成
+                try:
+                    token = await self._execute_on_resident_tab(resident_info)
+                    if token:
+                        debug_logger.log_info(f"[BrowserCaptcha] ✅ 重建后 Token生成成功")
+                        return token
+                except Exception:
+                    pass
         
         # 最终 Fallback: 使用传统模式
         debug_logger.log_warning(f"[BrowserCaptcha] 所有常驻方式失败，fallback 到传统模式 (project: {project_id})")
         return await self._get_token_legacy(project_id)
 
+    async def _get_or_create_resident_tab(self, project_id: str) -> Optional[ResidentTabInfo]:
+        """获取指定 project_id 的常驻标签页，不存在则创建
+        
+        同一 project_id 的并发调用共享同一次创建（single-flight），
+        不同 project_id 的创建互不阻塞。
+        
+        Args:
+            project_id: 项目 ID
+            
+        Returns:
+            ResidentTabInfo 对象，或 None（创建失败）
+        """
+        resident_info = self._resident_tabs.get(project_id)
+        if resident_info is not None:
+            self._resident_tabs.move_to_end(project_id)
+            return resident_info
+        
+        inflight = self._inflight.get(project_id)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        
+        inflight = asyncio.get_running_loop().create_future()
+        self._inflight[project_id] = inflight
+        try:
+            debug_logger.log_info(f"[BrowserCaptcha] project_id={project_id} 没有常驻标签页，正在创建...")
+            resident_info = await self._create_resident_tab(project_id)
+            if resident_info is not None:
+                async with self._resident_lock:
+                    await self._register_resident_tab(resident_info)
+                debug_logger.log_info(f"[BrowserCaptcha] ✅ 已为 project_id={project_id} 创建常驻标签页 (当前共 {len(self._resident_tabs)} 个)")
+            inflight.set_result(resident_info)
+            return resident_info
+        finally:
+            if not inflight.done():
+                inflight.set_result(None)
+            self._inflight.pop(project_id, None)
+
+    async def _rebuild_resident_tab(self, project_id: str, stale_info: ResidentTabInfo) -> Optional[ResidentTabInfo]:
+        """关闭失效的常驻标签页并重新创建
+        
+        仅当登记的仍是失效的那个标签页时才关闭，避免并发调用方关掉已重建的新标签页。
+        
+        Args:
+            project_id: 项目 ID
+            stale_info: 调用方发现失效的常驻标签页信息
+            
+        Returns:
+            新的 ResidentTabInfo 对象，或 None（重建失败）
+        """
+        async with self._resident_lock:
+            if self._resident_tabs.get(project_id) is stale_info:
+                await self._close_resident_tab(project_id)
+        return await self._get_or_create_resident_tab(project_id)
+
     async def _create_resident_tab(self, project_id: str) -> Optional[ResidentTabInfo]:
         """为指定 project_id 创建常驻标签页
         
@@ -390,20 +766,11 @@ class BrowserCaptchaService:
             tab = await self.browser.get(website_url, new_tab=True)
             
             # 等待页面加载完成
-            page_loaded = False
-            for retry in range(60):
-                try:
-                    await asyncio.sleep(1)
-                    ready_state = await tab.evaluate("document.readyState")
-                    if ready_state == "complete":
-                        page_loaded = True
-                        break
-                except ConnectionRefusedError as e:
-                    debug_logger.log_warning(f"[BrowserCaptcha] 标签页连接丢失: {e}")
-                    return None
-                except Exception as e:
-                    debug_logger.log_warning(f"[BrowserCaptcha] 等待页面异常: {e}，重试 {retry + 1}/60...")
-                    await asyncio.sleep(1)
+            try:
+                page_loaded = await self._wait_for_page_load(tab)
+            except ConnectionRefusedError as e:
+                debug_logger.log_warning(f"[BrowserCaptcha] 标签页连接丢失: {e}")
+                return None
             
             if not page_loaded:
                 debug_logger.log_error(f"[BrowserCaptcha] 页面加载超时 (project: {project_id})")
@@ -424,8 +791,12 @@ class BrowserCaptchaService:
                     pass
                 return None
             
+            # 预装 token 生成函数
+            if not await self._install_token_function(tab):
+                debug_logger.log_warning(f"[BrowserCaptcha] token 生成函数预装失败，将在首次生成时安装 (project: {project_id})")
+            
             # 创建常驻信息对象
-            resident_info = ResidentTabInfo(tab, project_id)
+            resident_info = ResidentTabInfo(tab, project_id, self.PREFETCH_QUEUE_SIZE)
             resident_info.recaptcha_ready = True
             
             debug_logger.log_info(f"[BrowserCaptcha] ✅ 常驻标签页创建成功 (project: {project_id})")
@@ -442,16 +813,150 @@ class BrowserCaptchaService:
             project_id: 项目 ID
         """
         resident_info = self._resident_tabs.pop(project_id, None)
+        if resident_info and resident_info.refill_task:
+            resident_info.refill_task.cancel()
+            resident_info.refill_task = None
+        if resident_info and resident_info.reload_task:
+            resident_info.reload_task.cancel()
         if resident_info and resident_info.tab:
+            # 等待标签页上进行中的 token 生成结束后再关闭，避免中途打断调用方触发重建
+            async with resident_info.lock:
+                try:
+                    await resident_info.tab.close()
+                    debug_logger.log_info(f"[BrowserCaptcha] 已关闭 project_id={project_id} 的常驻标签页")
+                except Exception as e:
+                    debug_logger.log_warning(f"[BrowserCaptcha] 关闭标签页时异常: {e}")
+
+    async def _register_resident_tab(self, resident_info: ResidentTabInfo):
+        """登记常驻标签页并启动其 token 预取任务（调用方需持有 _resident_lock）
+        
+        标签页池超过 MAX_RESIDENT_TABS 时关闭最久未使用的标签页，优先选择当前空闲的标签页。
+        
+        Args:
+            resident_info: 已就绪的常驻标签页信息
+        """
+        self._resident_tabs[resident_info.project_id] = resident_info
+        self._resident_tabs.move_to_end(resident_info.project_id)
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+        while len(self._resident_tabs) > self.MAX_RESIDENT_TABS:
+            candidates = [pid for pid in self._resident_tabs if pid != resident_info.project_id]
+            lru_project_id = next(
+                (pid for pid in candidates if not self._resident_tabs[pid].lock.locked()),
+                candidates[0]
+            )
+            debug_logger.log_info(f"[BrowserCaptcha] 常驻标签页已达上限 {self.MAX_RESIDENT_TABS}，关闭最久未使用的 project_id={lru_project_id}")
+            await self._close_resident_tab(lru_project_id)
+        resident_info.refill_task = asyncio.create_task(self._refill_loop(resident_info))
+        resident_info.refill_event.set()
+
+    async def _health_loop(self):
+        """定期探测所有常驻标签页，失效时在后台重建，避免由用户请求发现失效"""
+        try:
+            while True:
+                await asyncio.sleep(self.HEALTH_CHECK_INTERVAL)
+                for project_id, resident_info in list(self._resident_tabs.items()):
+                    # 正在生成 token 或刷新的标签页视为存活
+                    if resident_info.lock.locked():
+                        continue
+                    try:
+                        await asyncio.wait_for(resident_info.tab.evaluate("1"), self.HEALTH_CHECK_TIMEOUT)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        debug_logger.log_warning(f"[BrowserCaptcha] 常驻标签页健康检查失败 (project: {project_id}): {e}，后台重建...")
+                        new_info = await self._rebuild_resident_tab(project_id, resident_info)
+                        if new_info and project_id == self.resident_project_id:
+                            self.resident_tab = new_info.tab
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            debug_logger.log_error(f"[BrowserCaptcha] 健康检查任务异常退出: {e}")
+
+    async def _refill_loop(self, resident_info: ResidentTabInfo):
+        """后台补充预取 token，直到队列填满；每次取出 token 后被唤醒继续补充
+        
+        Args:
+            resident_info: 常驻标签页信息
+        """
+        queue = resident_info.token_queue
+        try:
+            while True:
+                await resident_info.refill_event.wait()
+                resident_info.refill_event.clear()
+                while not queue.full():
+                    token = await self._execute_on_resident_tab(resident_info)
+                    if not token:
+                        break
+                    queue.put_nowait((token, time.monotonic()))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            debug_logger.log_warning(f"[BrowserCaptcha] token 预取任务异常 (project: {resident_info.project_id}): {e}")
+
+    def _pop_prefetched_token(self, resident_info: ResidentTabInfo) -> Optional[str]:
+        """取出一个未过期的预取 token，并触发后台补充
+        
+        Args:
+            resident_info: 常驻标签页信息
+            
+        Returns:
+            预取的 token，队列为空或均已过期时返回 None
+        """
+        token = None
+        while token is None:
             try:
-                await resident_info.tab.close()
-                debug_logger.log_info(f"[BrowserCaptcha] 已关闭 project_id={project_id} 的常驻标签页")
-            except Exception as e:
-                debug_logger.log_warning(f"[BrowserCaptcha] 关闭标签页时异常: {e}")
+                candidate, created_at = resident_info.token_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if time.monotonic() - created_at <= self.PREFETCH_TOKEN_TTL:
+                token = candidate
+        resident_info.refill_event.set()
+        return token
+
+    def _pop_cached_token(self, project_id: str) -> Optional[str]:
+        """从传统模式缓存中取出一个仍有效的 token
+
+        Args:
+            project_id: Flow项目ID
+
+        Returns:
+            缓存的 token，没有可用 token 时返回 None
+        """
+        cached = self._token_cache.get(project_id)
+        now = time.monotonic()
+        while cached:
+            token, expires_at = cached.pop(0)
+            if expires_at - now > self.TOKEN_CACHE_MIN_REMAINING:
+                return token
+        self._token_cache.pop(project_id, None)
+        return None
 
     async def _get_token_legacy(self, project_id: str) -> Optional[str]:
+        """传统模式获取 reCAPTCHA token
+
+        同一 project_id 串行执行：等待锁的调用方优先使用上一次开页时缓存的 token
+
+        Args:
+            project_id: Flow项目ID
+
+        Returns:
+            reCAPTCHA token字符串，如果获取失败返回None
+        """
+        lock = self._legacy_locks.setdefault(project_id, asyncio.Lock())
+        async with lock:
+            token = self._pop_cached_token(project_id)
+            if token:
+                if debug_logger.enabled:
+                    debug_logger.log_info(f"[BrowserCaptcha] [Legacy] ✅ 使用缓存 token (project: {project_id})")
+                return token
+            return await self._fetch_token_legacy(project_id)
+
+    async def _fetch_token_legacy(self, project_id: str) -> Optional[str]:
         """传统模式获取 reCAPTCHA token（每次创建新标签页）
 
+        同一页面并发生成多个 token，多余的 token 缓存供后续请求使用
+
         Args:
             project_id: Flow项目ID
 
@@ -459,8 +964,7 @@ class BrowserCaptchaService:
             reCAPTCHA token字符串，如果获取失败返回None
         """
         # 确保浏览器已启动
-        if not self._initialized or not self.browser:
-            await self.initialize()
+        await self.initialize()
 
         start_time = time.time()
         tab = None
@@ -470,18 +974,12 @@ class BrowserCaptchaService:
             debug_logger.log_info(f"[BrowserCaptcha] [Legacy] 访问页面: {website_url}")
 
             # 新建标签页并访问页面
-            tab = await self.browser.get(website_url)
+            tab = await self.browser.get(website_url, new_tab=True)
 
-            # 等待页面完全加载（增加等待时间）
+            # 等待页面加载完成
             debug_logger.log_info("[BrowserCaptcha] [Legacy] 等待页面加载...")
-            await tab.sleep(3)
-            
-            # 等待页面 DOM 完成
-            for _ in range(10):
-                ready_state = await tab.evaluate("document.readyState")
-                if ready_state == "complete":
-                    break
-                await tab.sleep(0.5)
+            if not await self._wait_for_page_load(tab, timeout=15):
+                debug_logger.log_warning("[BrowserCaptcha] [Legacy] 页面加载超时，继续尝试检测 reCAPTCHA")
 
             # 等待 reCAPTCHA 加载
             recaptcha_ready = await self._wait_for_recaptcha(tab)
@@ -492,7 +990,14 @@ class BrowserCaptchaService:
 
             # 执行 reCAPTCHA
             debug_logger.log_info("[BrowserCaptcha] [Legacy] 执行 reCAPTCHA 验证...")
-            token = await self._execute_recaptcha_on_tab(tab)
+            results = await asyncio.gather(
+                *(self._execute_recaptcha_on_tab(tab) for _ in range(1 + self.LEGACY_EXTRA_TOKENS))
+            )
+            tokens = [t for t in results if t]
+            token = tokens[0] if tokens else None
+            if len(tokens) > 1:
+                expires_at = time.monotonic() + self.PREFETCH_TOKEN_TTL
+                self._token_cache.setdefault(project_id, []).extend((t, expires_at) for t in tokens[1:])
 
             duration_ms = (time.time() - start_time) * 1000
 
@@ -516,8 +1021,20 @@ class BrowserCaptchaService:
 
     async def close(self):
         """关闭浏览器"""
+        async with self._state_lock:
+            if self.state == ServiceState.UNINIT and not self.browser:
+                return
+            self._set_state(ServiceState.CLOSING)
+            try:
+                await self._close_locked()
+            finally:
+                self._set_state(ServiceState.UNINIT)
+
+    async def _close_locked(self):
+        """关闭浏览器（调用方需持有 _state_lock，状态为 CLOSING）"""
         # 先停止所有常驻模式（关闭所有常驻标签页）
-        await self.stop_resident_mode()
+        await self._stop_resident_mode_locked()
+        await self._discard_legacy_resident_tab(close_tab=False)
         
         try:
             if self.browser:
@@ -528,7 +1045,6 @@ class BrowserCaptchaService:
                 finally:
                     self.browser = None
 
-            self._initialized = False
             self._resident_tabs.clear()  # 确保清空常驻字典
             debug_logger.log_info("[BrowserCaptcha] 浏览器已关闭")
         except Exception as e:
@@ -562,17 +1078,7 @@ class BrowserCaptchaService:
         debug_logger.log_info(f"[BrowserCaptcha] 开始刷新 Session Token (project: {project_id})...")
         
         # 尝试获取或创建常驻标签页
-        async with self._resident_lock:
-            resident_info = self._resident_tabs.get(project_id)
-            
-            # 如果该 project_id 没有常驻标签页，则创建
-            if resident_info is None:
-                debug_logger.log_info(f"[BrowserCaptcha] project_id={project_id} 没有常驻标签页，正在创建...")
-                resident_info = await self._create_resident_tab(project_id)
-                if resident_info is None:
-                    debug_logger.log_warning(f"[BrowserCaptcha] 无法为 project_id={project_id} 创建常驻标签页")
-                    return None
-                self._resident_tabs[project_id] = resident_info
+        resident_info = await self._get_or_create_resident_tab(project_id)
         
         if not resident_info or not resident_info.tab:
             debug_logger.log_error(f"[BrowserCaptcha] 无法获取常驻标签页")
@@ -583,17 +1089,15 @@ class BrowserCaptchaService:
         try:
             # 刷新页面以获取最新的 cookies
             debug_logger.log_info(f"[BrowserCaptcha] 刷新常驻标签页以获取最新 cookies...")
-            await tab.reload()
-            
-            # 等待页面加载完成
-            for i in range(30):
-                await asyncio.sleep(1)
-                try:
-                    ready_state = await tab.evaluate("document.readyState")
-                    if ready_state == "complete":
-                        break
-                except Exception:
-                    pass
+            async with resident_info.lock:
+                # 订阅 Page.loadEventFired 后刷新，加载完成即返回（最多 30 秒）
+                if not await self._wait_for_page_load(tab, reload=True, timeout=30):
+                    debug_logger.log_warning("[BrowserCaptcha] 常驻标签页刷新超时，继续尝试读取 cookies")
+                # 刷新后 reCAPTCHA 与预装函数均已丢失，重新等待就绪并安装，保证后续 token 生成可用
+                if await self._wait_for_recaptcha(tab):
+                    await self._install_token_function(tab)
+                else:
+                    debug_logger.log_warning(f"[BrowserCaptcha] 刷新后 reCAPTCHA 未就绪 (project: {project_id})")
             
             # 额外等待确保 cookies 已设置
             await asyncio.sleep(2)
@@ -639,20 +1143,17 @@ class BrowserCaptchaService:
             debug_logger.log_error(f"[BrowserCaptcha] 刷新 Session Token 异常: {str(e)}")
             
             # 常驻标签页可能已失效，尝试重建
-            async with self._resident_lock:
-                await self._close_resident_tab(project_id)
-                resident_info = await self._create_resident_tab(project_id)
-                if resident_info:
-                    self._resident_tabs[project_id] = resident_info
-                    # 重建后再次尝试获取
-                    try:
-                        cookies = await self.browser.cookies.get_all()
-                        for cookie in cookies:
-                            if cookie.name == "__Secure-next-auth.session-token":
-                                debug_logger.log_info(f"[BrowserCaptcha] ✅ 重建后 Session Token 获取成功")
-                                return cookie.value
-                    except Exception:
-                        pass
+            resident_info = await self._rebuild_resident_tab(project_id, resident_info)
+            if resident_info:
+                # 重建后再次尝试获取
+                try:
+                    cookies = await self.browser.cookies.get_all()
+                    for cookie in cookies:
+                        if cookie.name == "__Secure-next-auth.session-token":
+                            debug_logger.log_info(f"[BrowserCaptcha] ✅ 重建后 Session Token 获取成功")
+                            return cookie.value
+                except Exception:
+                    pass
             
             return None
 
@@ -660,7 +1161,7 @@ class BrowserCaptchaService:
 
     def is_resident_mode_active(self) -> bool:
         """检查是否有任何常驻标签页激活"""
-        return len(self._resident_tabs) > 0 or self._running
+        return len(self._resident_tabs) > 0 or self.state == ServiceState.CAPTCHA_READY
 
     def get_resident_count(self) -> int:
         """获取当前常驻标签页数量"""